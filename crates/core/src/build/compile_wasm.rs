@@ -30,6 +30,9 @@ use crate::{
     utils,
 };
 
+/// Artifact cache helpers, imported by the built-in compiler scripts.
+const ARTIFACTS_SCRIPT: &str = include_str!("./compilers/artifacts.py");
+
 pub struct MainCompiler<'a> {
     global_ctx: &'a GlobalCtx<'a>,
     comptime: Cell<bool>,
@@ -128,6 +131,7 @@ impl WasmCompiler for MainCompiler<'_> {
             ),
             ScriptOrFile::Script(script) => {
                 fs::write(dir.path().join("__tmp.py"), script)?;
+                fs::write(dir.path().join("artifacts.py"), ARTIFACTS_SCRIPT)?;
                 Cow::Borrowed(Path::new("__tmp.py"))
             }
         };
@@ -136,6 +140,7 @@ impl WasmCompiler for MainCompiler<'_> {
         defer! {
             if matches!(&config.script, ScriptOrFile::Script(_)) {
                 fs::remove_file(dir.path().join("__tmp.py")).expect("error removing \"__tmp.py\"! Remove it manually!");
+                fs::remove_file(dir.path().join("artifacts.py")).expect("error removing \"artifacts.py\"! Remove it manually!");
             }
         }
 
@@ -157,6 +162,14 @@ impl WasmCompiler for MainCompiler<'_> {
                 "DECOR_COMPTIME",
                 self.comptime.get().then_some("1").unwrap_or_default(),
             )
+            .env(
+                "DECOR_COLOR",
+                self.global_ctx
+                    .args
+                    .color
+                    .then_some("1")
+                    .unwrap_or_default(),
+            )
             .current_dir(dir.path())
             .args(&self.global_ctx.args.build_args)
             .output()?;
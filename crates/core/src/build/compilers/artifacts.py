@@ -0,0 +1,71 @@
+# Build artifact cache shared by the built-in compiler scripts. The driver
+# writes this module next to the script, which imports it.
+from pathlib import Path
+import hashlib
+import os
+import shutil
+import sys
+
+# Artifacts are kept per input file; older entries beyond this are evicted
+MAX_ARTIFACTS = 8
+
+
+def artifact_key(*parts) -> str:
+    # The compiler script and this module are part of the key, so changing how
+    # either builds invalidates artifacts from older versions
+    h = hashlib.blake2b(digest_size=16)
+    for script in (sys.modules["__main__"].__file__, __file__):
+        h.update(Path(script).read_bytes())
+    for part in parts:
+        h.update(b"\0")
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+    return h.hexdigest()
+
+
+def restore_artifacts(cache: str, key: str, outdir_abs: str | Path) -> bool:
+    cached = os.path.join(cache, "artifacts", key)
+    try:
+        # Mark the entry as recently used so it outlives older ones
+        os.utime(cached)
+        shutil.copytree(cached, outdir_abs, dirs_exist_ok=True)
+    except OSError:
+        # Missing, or evicted by a concurrent build while being copied
+        return False
+    return True
+
+
+def store_artifacts(cache: str, key: str, outdir_abs: str | Path):
+    # The build already succeeded, so failing to cache its output is not an error
+    artifacts = os.path.join(cache, "artifacts")
+    tmp = os.path.join(artifacts, f"{key}.{os.getpid()}.tmp")
+    try:
+        shutil.copytree(outdir_abs, tmp)
+        # copytree copies the output dir's mtime, but eviction goes by use time
+        os.utime(tmp)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        return
+    try:
+        os.rename(tmp, os.path.join(artifacts, key))
+    except OSError:
+        # Another build stored the same artifacts first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    # In-progress stores of other builds are left alone, and entries that a
+    # concurrent build evicts in the meantime are skipped
+    entries = []
+    try:
+        with os.scandir(artifacts) as it:
+            for entry in it:
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    if entry.is_dir():
+                        entries.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    pass
+    except OSError:
+        return
+    entries.sort(reverse=True)
+    for _, path in entries[MAX_ARTIFACTS:]:
+        shutil.rmtree(path, ignore_errors=True)
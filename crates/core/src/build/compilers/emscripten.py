@@ -1,13 +1,46 @@
 from pathlib import Path
+import json
 import os
+import shutil
+import subprocess
 import sys
 
+from artifacts import artifact_key, restore_artifacts, store_artifacts
+
+GLUE = 'import init from "./%s/%s.js";\nlet wasm = await init();\n'
+
 
 def main():
     input = Path(os.environ["DECOR_INPUT"])
     outdir = Path(os.environ["DECOR_OUT"])
     outdir_abs = Path(os.environ["DECOR_OUT_DIR"])
+    cache = os.environ["DECOR_CACHE"]
+    asyncify = os.environ.get("DECOR_ASYNCIFY") == "1"
     name = input.stem
+
+    # Resolved through which() so that emcc.bat is found on Windows without a shell
+    emcc = shutil.which("emcc") or "emcc"
+    key = artifact_key(
+        input.read_bytes(),
+        get_emcc_version(cache, emcc),
+        input.suffix,
+        outdir,
+        asyncify,
+    )
+    glue = GLUE % (outdir, name)
+    if restore_artifacts(cache, key, outdir_abs):
+        sys.stdout.write(glue)
+        return
+
+    # Have emcc route its clang invocations through a compiler cache, if available
+    wrapper = shutil.which("sccache") or shutil.which("ccache")
+    if wrapper:
+        os.environ.setdefault("EM_COMPILER_WRAPPER", wrapper)
+        # sccache only reads SCCACHE_DIR when its server starts, so a per-input
+        # dir would end up shared by every later input; it keeps its own default
+        if cache:
+            os.environ.setdefault("CCACHE_DIR", os.path.join(cache, "ccache"))
+
     pre = "__pre.js"
 
     # The contents of this file will run before the JavaScript glue
@@ -24,24 +57,57 @@ def main():
         raise Exception("problem writing __pre.js")
 
     out_name = (outdir_abs / name).with_suffix(".js")
-    status = os.system(
-        f'emcc \
-            --pre-js "{pre}" \
-            {input} -o {out_name} \
-            -s NO_EXIT_RUNTIME=1 \
-            -s MODULARIZE=1 \
-            -s EXPORT_ES6=1 \
-            -s EXPORT_NAME="initModule" \
-            -s ASYNCIFY \
-            -s EXPORTED_RUNTIME_METHODS=\'["ccall"]\''
-    )
+    args = [
+        emcc,
+        "--pre-js",
+        pre,
+        input,
+        "-o",
+        out_name,
+        "-s",
+        "NO_EXIT_RUNTIME=1",
+        "-s",
+        "MODULARIZE=1",
+        "-s",
+        "EXPORT_ES6=1",
+        "-s",
+        "EXPORT_NAME=initModule",
+        "-s",
+        'EXPORTED_RUNTIME_METHODS=["ccall"]',
+    ]
+    if asyncify:
+        # Asyncify transforms the whole module, so it's only enabled on request
+        args += ["-s", "ASYNCIFY"]
+    # Our stdout is reserved for the JS glue, so emcc's stdout is pointed straight
+    # at stderr
+    status = subprocess.run(args, stdout=sys.stderr).returncode
     if status != 0:
         raise Exception("error compiling emscripten")
+    store_artifacts(cache, key, outdir_abs)
 
-    print(
-        f"""import init from "./{outdir}/{name}.js";
-let wasm = await init();"""
-    )
+    sys.stdout.write(glue)
+
+
+def get_emcc_version(cache: str, emcc: str) -> str:
+    # emcc is a Python program and slow to start, so its version is cached for as
+    # long as the emcc launcher stays the same
+    key = f"{emcc}:{os.stat(emcc).st_mtime_ns}"
+    version_path = os.path.join(cache, "emcc_version.json")
+    try:
+        with open(version_path) as f:
+            emcc_version = json.load(f)
+        if emcc_version["key"] == key:
+            return emcc_version["version"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+
+    version = subprocess.run(
+        [emcc, "--version"], capture_output=True, check=True
+    ).stdout.splitlines()[0]
+    emcc_version = {"key": key, "version": version.decode()}
+    with open(version_path, "w") as f:
+        json.dump(emcc_version, f)
+    return emcc_version["version"]
 
 
 if __name__ == "__main__":
@@ -1,6 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import json
 import os
 import subprocess
 import shutil
+import sys
+
+from artifacts import artifact_key, restore_artifacts, store_artifacts
+
+GLUE_PREFIX = 'import "./%s/wasm_exec.js";\nconst go = new Go();\n'
+GLUE_IMPORTS = "go.importObject.env = { %s };\n"
+GLUE_SUFFIX = """let wasm = await WebAssembly.instantiateStreaming(fetch("%s/out.wasm"), go.importObject);
+go.run(wasm.instance);
+wasm = wasm.instance.exports;
+"""
 
 
 def main():
@@ -8,29 +21,68 @@ def main():
     outdir = os.environ["DECOR_OUT"]
     outdir_abs = os.environ["DECOR_OUT_DIR"]
     exports = os.environ["DECOR_EXPORTS"]
+    cache = os.environ["DECOR_CACHE"]
 
     os.environ["GOOS"] = "js"
     os.environ["GOARCH"] = "wasm"
-    go_root = subprocess.run(
-        ["go", "env", "GOROOT"], capture_output=True
-    ).stdout.strip()
-    wasm_exec = os.path.join(go_root.decode(), "misc", "wasm", "wasm_exec.js")
-    shutil.copy(wasm_exec, outdir_abs)
-    shutil.copy(input, "main.go")
-    subprocess.run(["go", "mod", "init", "github.com/dzfrias/decorous"], check=True)
-    subprocess.run(
-        ["go", "build", "-o", os.path.join(outdir_abs, "out.wasm")], check=True
-    )
-
-    print(f'import "./{outdir}/wasm_exec.js";\nconst go = new Go();')
+    go_env = get_go_env(cache)
+    contents = Path(input).read_bytes()
+    key = artifact_key(contents, go_env["GOVERSION"])
+    if not restore_artifacts(cache, key, outdir_abs):
+        wasm_exec = os.path.join(go_env["GOROOT"], "misc", "wasm", "wasm_exec.js")
+        # None of these depend on each other, so the file copies happen while
+        # `go mod init` runs
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            copies = [
+                executor.submit(
+                    shutil.copyfile, wasm_exec, os.path.join(outdir_abs, "wasm_exec.js")
+                ),
+                executor.submit(Path("main.go").write_bytes, contents),
+            ]
+            subprocess.run(
+                ["go", "mod", "init", "github.com/dzfrias/decorous"], check=True
+            )
+            for copy in copies:
+                copy.result()
+        subprocess.run(
+            ["go", "build", "-o", os.path.join(outdir_abs, "out.wasm")], check=True
+        )
+        store_artifacts(cache, key, outdir_abs)
+
+    glue = [GLUE_PREFIX % outdir]
     if exports:
         import_inner = ", ".join([str(exp) for exp in exports.split(" ")])
-        print(f"go.importObject.env = {{ {import_inner} }};")
-    print(
-        f"""let wasm = await WebAssembly.instantiateStreaming(fetch("{outdir}/out.wasm"), go.importObject);
-go.run(wasm.instance);
-wasm = wasm.instance.exports;"""
-    )
+        glue.append(GLUE_IMPORTS % import_inner)
+    glue.append(GLUE_SUFFIX % outdir)
+    # Emitted with a single write
+    sys.stdout.buffer.write("".join(glue).encode())
+    sys.stdout.buffer.flush()
+
+
+def get_go_env(cache: str) -> dict:
+    # `go env` starts up a whole Go process, so its answer is cached for as long
+    # as the go binary (and any GOROOT override) stays the same
+    go_bin = shutil.which("go")
+    if go_bin is None:
+        raise Exception("go not found in $PATH")
+    key = f"{go_bin}:{os.stat(go_bin).st_mtime_ns}:{os.environ.get('GOROOT', '')}"
+    env_path = os.path.join(cache, "go_env.json")
+    try:
+        with open(env_path) as f:
+            go_env = json.load(f)
+        if go_env["key"] == key:
+            return go_env
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+
+    names = ["GOROOT", "GOVERSION"]
+    values = subprocess.run(
+        [go_bin, "env", *names], capture_output=True, check=True
+    ).stdout.decode()
+    go_env = {"key": key, **dict(zip(names, values.splitlines()))}
+    with open(env_path, "w") as f:
+        json.dump(go_env, f)
+    return go_env
 
 
 if __name__ == "__main__":
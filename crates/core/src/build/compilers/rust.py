@@ -1,52 +1,83 @@
+import hashlib
 import os
 import shutil
 import sys
 import subprocess
+import tempfile
 from pathlib import Path
 
+from artifacts import artifact_key, restore_artifacts, store_artifacts
+
+PROJECT_NAME = "decor-out"
+COMPTIME_PROJECT_NAME = "decor-out-comptime"
+GLUE = 'import init, * as wasm from "/%s/__tmp.js";\nawait init();\n'
+
 
 def main():
     input = Path(os.environ["DECOR_INPUT"])
     outdir = os.environ["DECOR_OUT"]
-    cache = os.environ["DECOR_CACHE"]
+    cache = os.environ.get("DECOR_CACHE") or user_cache_dir()
+    # Generated crates for every input live in one workspace in the user cache,
+    # so dependencies like wasm-bindgen are compiled once into a single shared
+    # target dir. It is meant to persist across invocations; removing it throws
+    # away cargo's incremental state and forces a full rebuild.
+    workspace = os.path.join(user_cache_dir(), "rust-workspace")
+    target_dir = os.path.join(workspace, "target")
+    os.environ["CARGO_TARGET_DIR"] = target_dir
     outdir_abs = os.environ["DECOR_OUT_DIR"]
+    comptime = os.environ["DECOR_COMPTIME"] == "1"
+    color = "always" if os.environ["DECOR_COLOR"] == "1" else "never"
     name = input.stem
-    with open(input, "r") as file:
-        contents = file.read()
+    contents = input.read_bytes()
+    # Each input gets its own member crates, named after its cache dir
+    member = hashlib.blake2b(cache.encode(), digest_size=8).hexdigest()
 
-    PROJECT_NAME = "decor-out"
+    versions = [subprocess.run(["rustc", "-V"], capture_output=True, check=True).stdout]
+    if not comptime:
+        if not shutil.which("wasm-pack"):
+            raise Exception("wasm-pack not found in $PATH! Make sure to install it!")
+        # wasm-pack shapes the emitted JS and wasm, so an upgrade invalidates them
+        versions.append(
+            subprocess.run(
+                ["wasm-pack", "--version"], capture_output=True, check=True
+            ).stdout
+        )
+    key = artifact_key(contents, *versions, outdir, name, comptime, *sys.argv[1:])
+    glue = GLUE % outdir
+    if restore_artifacts(cache, key, outdir_abs):
+        sys.stdout.write(glue)
+        return
 
-    if not os.environ["DECOR_COMPTIME"]:
-        create_wasm_bindgen_project(PROJECT_NAME)
+    if not comptime:
+        crate_name = f"{PROJECT_NAME}-{member}"
+        crate = create_wasm_bindgen_project(workspace, crate_name)
 
-        lib_path = os.path.join("src", "lib.rs")
-        with open(lib_path, "w") as f:
-            f.write(contents)
+        lib_path = os.path.join(crate, "src", "lib.rs")
+        write_if_changed(lib_path, contents)
     else:
-        subprocess.run(["cargo", "init", "--name", PROJECT_NAME], check=True)
-        lib_path = os.path.join("src", "main.rs")
-        with open(lib_path, "w") as f:
-            f.write(contents)
+        crate_name = f"{COMPTIME_PROJECT_NAME}-{member}"
+        crate = create_comptime_project(workspace, crate_name)
 
-    if os.environ["DECOR_COMPTIME"]:
-        subprocess.run(
+        lib_path = os.path.join(crate, "src", "main.rs")
+        write_if_changed(lib_path, contents)
+
+    if comptime:
+        run(
             [
                 "cargo",
                 "build",
                 "--target",
                 "wasm32-wasi",
-                "--target-dir",
-                cache,
+                "--package",
+                crate_name,
                 "--color",
-                "always",
+                color,
                 *sys.argv[1:],
             ],
-            check=True,
+            cwd=workspace,
         )
-        wasm_path = f"{cache}/wasm32-wasi/debug/{PROJECT_NAME}.wasm"
-        shutil.move(wasm_path, outdir_abs)
     else:
-        subprocess.run(
+        run(
             [
                 "wasm-pack",
                 "build",
@@ -57,24 +88,68 @@ def main():
                 "--out-dir",
                 outdir_abs,
                 "--color",
-                "always",
-                "--target-dir",
-                cache,
+                color,
+                os.path.join("crates", crate_name),
                 *sys.argv[1:],
             ],
-            check=True,
+            cwd=workspace,
         )
 
-    print(
-        f"""import init, * as wasm from "/{outdir}/__tmp.js";
-await init();"""
-    )
+    if comptime:
+        # Copied rather than moved, so cargo still finds its output up to date
+        # on the next build
+        wasm_path = os.path.join(
+            target_dir, "wasm32-wasi", "debug", f"{crate_name}.wasm"
+        )
+        shutil.copyfile(
+            wasm_path, os.path.join(outdir_abs, f"{COMPTIME_PROJECT_NAME}.wasm")
+        )
+    store_artifacts(cache, key, outdir_abs)
+
+    sys.stdout.write(glue)
+
+
+def run(args: list, **kwargs):
+    # Our stdout is reserved for the JS glue, so the tool's stdout is pointed
+    # straight at stderr. The child writes to the fd itself; nothing is copied
+    # through Python.
+    subprocess.run(args, stdout=sys.stderr, check=True, **kwargs)
+
+
+def create_workspace(workspace: str):
+    manifest = os.path.join(workspace, "Cargo.toml")
+    if not os.path.exists(manifest):
+        os.makedirs(workspace, exist_ok=True)
+        with open(manifest, "w") as f:
+            f.write('[workspace]\nmembers = ["crates/*"]\nresolver = "2"\n')
 
 
-def create_wasm_bindgen_project(name: str):
-    subprocess.run(["cargo", "init", "--lib", "--name", name], check=True)
-    with open(f"Cargo.toml", "w") as f:
-        contents = f"""[package]
+def create_comptime_project(workspace: str, name: str) -> str:
+    create_workspace(workspace)
+    crate = os.path.join(workspace, "crates", name)
+    # Reused between builds, along with the workspace's Cargo.lock, so cargo
+    # doesn't have to re-resolve or rebuild anything that hasn't changed
+    if not os.path.exists(os.path.join(crate, "Cargo.toml")):
+        subprocess.run(
+            ["cargo", "init", "--vcs", "none", "--name", name, crate], check=True
+        )
+    return crate
+
+
+def create_wasm_bindgen_project(workspace: str, name: str) -> str:
+    create_workspace(workspace)
+    crate = os.path.join(workspace, "crates", name)
+    manifest = os.path.join(crate, "Cargo.toml")
+    if not os.path.exists(manifest):
+        subprocess.run(
+            ["cargo", "init", "--lib", "--vcs", "none", "--name", name, crate],
+            check=True,
+        )
+    # Written on every build (a no-op when unchanged), so a build interrupted
+    # between `cargo init` and here doesn't leave the default manifest behind
+    write_if_changed(
+        manifest,
+        f"""[package]
 name = "{name}"
 version = "0.1.0"
 edition = "2021"
@@ -84,8 +159,49 @@ crate-type = ["cdylib"]
 
 [dependencies]
 wasm-bindgen = "0.2"
-"""
-        f.write(contents)
+""".encode(),
+    )
+
+    return crate
+
+
+def write_if_changed(path: str, contents: bytes):
+    # Rewriting identical contents bumps the mtime, which cargo treats as a change
+    try:
+        old = Path(path).read_bytes()
+    except FileNotFoundError:
+        old = None
+    if old != contents:
+        # Write to a temp file and rename over the target, so a concurrent build
+        # never reads a half-written source. The temp name is unique per writer.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(contents)
+            # mkstemp creates the file as owner-only; give it the mode open()
+            # would have, keeping the existing file's mode if there is one
+            try:
+                mode = os.stat(path).st_mode & 0o777
+            except FileNotFoundError:
+                umask = os.umask(0)
+                os.umask(umask)
+                mode = 0o666 & ~umask
+            os.chmod(tmp, mode)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+
+def user_cache_dir() -> str:
+    # Mirrors `utils::get_cache_base` on the Rust side
+    if sys.platform == "win32":
+        base = os.environ["LOCALAPPDATA"]
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/.cache")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "decorous")
 
 
 if __name__ == "__main__":
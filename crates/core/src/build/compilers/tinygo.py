@@ -1,9 +1,19 @@
+from pathlib import Path
 import os
-import shutil
 import subprocess
+import sys
+
+from artifacts import artifact_key, restore_artifacts, store_artifacts
+
+GLUE_PREFIX = 'import "./%s/wasm_exec.js";\nconst go = new Go();\n'
+GLUE_IMPORTS = "go.importObject.env = { %s };\n"
+GLUE_SUFFIX = """let wasm = await WebAssembly.instantiateStreaming(fetch("%s/out.wasm"), go.importObject);
+go.run(wasm.instance);
+wasm = wasm.instance.exports;
+"""
 
 # Taken from https://raw.githubusercontent.com/tinygo-org/tinygo/release/targets/wasm_exec.js
-WASM_EXEC = """// Copyright 2018 The Go Authors. All rights reserved.
+WASM_EXEC = b"""// Copyright 2018 The Go Authors. All rights reserved.
 // Use of this source code is governed by a BSD-style
 // license that can be found in the LICENSE file.
 //
@@ -546,11 +556,18 @@ def main():
     outdir = os.environ["DECOR_OUT"]
     outdir_abs = os.environ["DECOR_OUT_DIR"]
     exports = os.environ["DECOR_EXPORTS"]
-
-    with open(os.path.join(outdir_abs, "wasm_exec.js"), "w") as f:
-        f.write(WASM_EXEC)
-    shutil.copy(input, "main.go")
-    if not os.environ["DECOR_COMPTIME"]:
+    cache = os.environ["DECOR_CACHE"]
+    comptime = os.environ["DECOR_COMPTIME"] == "1"
+
+    tinygo_version = subprocess.run(
+        ["tinygo", "version"], capture_output=True, check=True
+    ).stdout
+    contents = Path(input).read_bytes()
+    key = artifact_key(contents, tinygo_version, comptime)
+    if not restore_artifacts(cache, key, outdir_abs):
+        # wasm_exec.js is bundled with this script, so no network access is needed
+        Path(outdir_abs, "wasm_exec.js").write_bytes(WASM_EXEC)
+        Path("main.go").write_bytes(contents)
         subprocess.run(
             [
                 "tinygo",
@@ -558,34 +575,21 @@ def main():
                 "-o",
                 os.path.join(outdir_abs, "out.wasm"),
                 "-target",
-                "wasm",
-                "main.go",
-            ],
-            check=True,
-        )
-    else:
-        subprocess.run(
-            [
-                "tinygo",
-                "build",
-                "-o",
-                os.path.join(outdir_abs, "out.wasm"),
-                "-target",
-                "wasi",
+                "wasi" if comptime else "wasm",
                 "main.go",
             ],
             check=True,
         )
+        store_artifacts(cache, key, outdir_abs)
 
-    print(f'import "./{outdir}/wasm_exec.js";\nconst go = new Go();')
+    glue = [GLUE_PREFIX % outdir]
     if exports:
         import_inner = ", ".join([str(exp) for exp in exports.split(" ")])
-        print(f"go.importObject.env = {{ {import_inner} }};")
-    print(
-        f"""let wasm = await WebAssembly.instantiateStreaming(fetch("{outdir}/out.wasm"), go.importObject);
-go.run(wasm.instance);
-wasm = wasm.instance.exports;"""
-    )
+        glue.append(GLUE_IMPORTS % import_inner)
+    glue.append(GLUE_SUFFIX % outdir)
+    # Emitted with a single write
+    sys.stdout.buffer.write("".join(glue).encode())
+    sys.stdout.buffer.flush()
 
 
 if __name__ == "__main__":
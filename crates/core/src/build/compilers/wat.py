@@ -3,6 +3,9 @@ import os
 import subprocess
 import sys
 
+GLUE = 'let wasm = (await WebAssembly.instantiateStreaming(fetch("./%s/%s.wasm"))).instance.exports;\n'
+GLUE_WITH_IMPORTS = 'let wasm = (await WebAssembly.instantiateStreaming(fetch("./%s/%s.wasm"), { env: { %s } })).instance.exports;\n'
+
 
 def main():
     input = Path(os.environ["DECOR_INPUT"])
@@ -23,14 +26,10 @@ def main():
     )
 
     if not exports:
-        print(
-            f'let wasm = (await WebAssembly.instantiateStreaming(fetch("./{outdir}/{name}.wasm"))).instance.exports;'
-        )
+        sys.stdout.write(GLUE % (outdir, name))
     else:
         import_inner = ", ".join([str(exp) for exp in exports.split(" ")])
-        print(
-            f'let wasm = (await WebAssembly.instantiateStreaming(fetch("./{outdir}/{name}.wasm"), {{ env: {{ {import_inner} }} }})).instance.exports;'
-        )
+        sys.stdout.write(GLUE_WITH_IMPORTS % (outdir, name, import_inner))
 
 
 if __name__ == "__main__":
@@ -1,43 +1,61 @@
 from pathlib import Path
+import errno
 import os
 import shutil
 import subprocess
 import sys
 
+from artifacts import artifact_key, restore_artifacts, store_artifacts
+
+GLUE = 'let wasm = (await WebAssembly.instantiateStreaming(fetch("./%s/%s.wasm"))).instance.exports;\n'
+GLUE_WITH_IMPORTS = 'let wasm = (await WebAssembly.instantiateStreaming(fetch("./%s/%s.wasm"), { env: { %s } })).instance.exports;\n'
+
 
 def main():
     input = Path(os.environ["DECOR_INPUT"])
     outdir = Path(os.environ["DECOR_OUT"])
     outdir_abs = Path(os.environ["DECOR_OUT_DIR"])
     exports = os.environ["DECOR_EXPORTS"]
+    cache = os.environ["DECOR_CACHE"]
+    color = os.environ["DECOR_COLOR"] == "1"
     name = input.stem
 
-    subprocess.run(
-        [
-            "zig",
-            "build-exe",
-            input,
-            "-target",
-            "wasm32-freestanding",
-            "-rdynamic",
-            "-fno-entry",
-            "--color",
-            "on",
-            *sys.argv[1:],
-        ],
-        check=True,
-    )
-    shutil.move(f"{name}.wasm", outdir_abs)
+    zig_version = subprocess.run(
+        ["zig", "version"], capture_output=True, check=True
+    ).stdout
+    key = artifact_key(input.read_bytes(), zig_version, name, *sys.argv[1:])
+    if not restore_artifacts(cache, key, outdir_abs):
+        subprocess.run(
+            [
+                "zig",
+                "build-exe",
+                input,
+                "-target",
+                "wasm32-freestanding",
+                "-rdynamic",
+                "-fno-entry",
+                "--color",
+                "on" if color else "off",
+                *sys.argv[1:],
+            ],
+            check=True,
+        )
+        wasm = f"{name}.wasm"
+        try:
+            os.replace(wasm, outdir_abs / wasm)
+        except OSError as e:
+            # The temp dir and outdir can be on different filesystems
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.copyfile(wasm, outdir_abs / wasm)
+            os.unlink(wasm)
+        store_artifacts(cache, key, outdir_abs)
 
     if not exports:
-        print(
-            f'let wasm = (await WebAssembly.instantiateStreaming(fetch("./{outdir}/{name}.wasm"))).instance.exports;'
-        )
+        sys.stdout.write(GLUE % (outdir, name))
     else:
         import_inner = ", ".join([str(exp) for exp in exports.split(" ")])
-        print(
-            f'let wasm = (await WebAssembly.instantiateStreaming(fetch("./{outdir}/{name}.wasm"), {{ env: {{ {import_inner} }} }})).instance.exports;'
-        )
+        sys.stdout.write(GLUE_WITH_IMPORTS % (outdir, name, import_inner))
 
 
 if __name__ == "__main__":
@@ -3,6 +3,9 @@ use std::{collections::HashMap, hash::Hash, path::PathBuf};
 use merge::Merge;
 use serde::{Deserialize, Deserializer};
 
+/// Shared by the C and C++ compilers.
+const EMSCRIPTEN_SCRIPT: &str = include_str!("./build/compilers/emscripten.py");
+
 #[derive(Debug, Deserialize)]
 #[serde(default)]
 pub struct Config {
@@ -66,24 +69,20 @@ impl Default for Config {
                     "c++".to_owned(),
                     CompilerConfig {
                         ext_override: Some("cpp".to_owned()),
-                        script: ScriptOrFile::Script(include_str!(
-                            "./build/compilers/emscripten.py"
-                        )),
+                        script: ScriptOrFile::Script(EMSCRIPTEN_SCRIPT),
                         features: vec![],
                         deps: vec!["emcc".to_owned()],
-                        use_cache: false,
+                        use_cache: true,
                     },
                 ),
                 (
                     "c".to_owned(),
                     CompilerConfig {
                         ext_override: None,
-                        script: ScriptOrFile::Script(include_str!(
-                            "./build/compilers/emscripten.py"
-                        )),
+                        script: ScriptOrFile::Script(EMSCRIPTEN_SCRIPT),
                         features: vec![],
                         deps: vec!["emcc".to_owned()],
-                        use_cache: false,
+                        use_cache: true,
                     },
                 ),
                 (
@@ -93,7 +92,7 @@ impl Default for Config {
                         script: ScriptOrFile::Script(include_str!("./build/compilers/zig.py")),
                         features: vec![],
                         deps: vec!["zig".to_owned()],
-                        use_cache: false,
+                        use_cache: true,
                     },
                 ),
                 (
@@ -103,7 +102,7 @@ impl Default for Config {
                         script: ScriptOrFile::Script(include_str!("./build/compilers/go.py")),
                         features: vec![WasmFeature(wasm_opt::Feature::BulkMemory)],
                         deps: vec!["go".to_owned()],
-                        use_cache: false,
+                        use_cache: true,
                     },
                 ),
                 (
@@ -113,7 +112,7 @@ impl Default for Config {
                         script: ScriptOrFile::Script(include_str!("./build/compilers/tinygo.py")),
                         features: vec![],
                         deps: vec!["tinygo".to_owned()],
-                        use_cache: false,
+                        use_cache: true,
                     },
                 ),
                 (